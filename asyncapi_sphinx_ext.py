@@ -1,4 +1,13 @@
 import os
+import re
+import copy
+import csv
+import json
+import math
+import hashlib
+import pickle
+import sqlite3
+import time
 from collections import defaultdict
 
 from typing import Any, Dict, IO, List, Pattern, Set, Tuple, Iterable
@@ -21,6 +30,7 @@ from sphinx.util.inspect import safe_getattr
 from docutils import nodes
 from docutils.parsers.rst import Directive, directives
 from docutils.parsers.rst.directives.admonitions import BaseAdmonition
+from docutils.parsers.rst.states import Body
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +40,8 @@ try:
 except:
     yaml = None
 
+__version__ = '1.1.0'
+
 
 def get_fields(x,parent=''):
     """ recursively gets definition_lists and field_lists into dictionaries """
@@ -57,6 +69,230 @@ def get_fields(x,parent=''):
                     fields[key] = all_res
     return fields
 
+_field_marker = re.compile(Body.patterns['field_marker'])
+# constructs which, unlike paragraphs, end at the next line of the same indent
+_item_marker = re.compile('|'.join(
+    '(?:%s)' % Body.patterns[name]
+    for name in ('explicit_markup', 'bullet', 'enumerator', 'option_marker',
+                 'line_block')
+))
+# grid tables span all following border and row lines
+_grid_table_top = Body.patterns['grid_table_top']
+
+
+class RstFieldParser:
+    """ parses the definition_list/field_list dialect straight into dictionaries
+
+    This gives the same result as running the docutils nested parse and
+    :func:`get_fields` on the first body element, but in a single pass over the
+    indented lines. ``location`` maps a line index to a ``source:line`` string
+    used for warnings, the warnings are also kept as (line index, message) in
+    ``warnings``.
+    """
+    # part of the parse cache key, bump whenever the output may change
+    revision = 4
+
+    def __init__(self, lines: List[str], location=None):
+        self.lines = [line.rstrip() for line in lines]
+        self.indents = [len(line) - len(line.lstrip()) for line in self.lines]
+        self.location = location
+        self.warnings = []
+
+    def parse(self) -> Dict:
+        elements = self.elements(0, len(self.lines))
+        if not elements:
+            return {}
+        return elements[0][1]
+
+    def blank(self, i: int) -> bool:
+        return not self.lines[i]
+
+    def skip_blank(self, i: int, end: int) -> int:
+        while i < end and self.blank(i):
+            i += 1
+        return i
+
+    def block_end(self, i: int, end: int, indent: int) -> int:
+        """ first non blank line at or after ``i`` indented at most ``indent`` """
+        while i < end and (self.blank(i) or self.indents[i] > indent):
+            i += 1
+        return i
+
+    def is_field(self, i: int) -> bool:
+        return _field_marker.match(self.lines[i], self.indents[i]) is not None
+
+    def is_item(self, i: int) -> bool:
+        return _item_marker.match(self.lines[i], self.indents[i]) is not None
+
+    def is_grid_table(self, i: int) -> bool:
+        return _grid_table_top.match(self.lines[i], self.indents[i]) is not None
+
+    def is_term(self, i: int, end: int) -> bool:
+        return (i + 1 < end and not self.is_field(i) and not self.is_item(i)
+                and not self.is_grid_table(i)
+                and not self.blank(i + 1)
+                and self.indents[i + 1] > self.indents[i])
+
+    def elements(self, start: int, end: int,
+                 parent: str = '') -> List[Tuple[int, Dict]]:
+        """ splits a block into its body elements as (line index, fields) """
+        elements = []
+        i = self.skip_blank(start, end)
+        if i >= end:
+            return elements
+        indent = min(self.indents[j] for j in range(i, end) if not self.blank(j))
+        while i < end:
+            first = i
+            if self.indents[i] > indent:  # block quote
+                fields = {}
+                i = self.block_end(i, end, indent)
+            elif self.is_grid_table(i):
+                fields = {}
+                i += 1
+                while (i < end and self.indents[i] == indent
+                       and self.lines[i].lstrip()[:1] in ('+', '|')):
+                    i += 1
+            elif self.is_item(i):  # comment, list item, option, ...
+                fields = {}
+                i = self.block_end(i + 1, end, indent)
+            elif self.is_field(i):
+                fields = {}
+                while i < end and self.indents[i] == indent and self.is_field(i):
+                    i = self.field(i, end, indent, fields)
+                    i = self.skip_blank(i, end)
+            elif self.is_term(i, end):
+                fields = {}
+                while i < end and self.indents[i] == indent and self.is_term(i, end):
+                    i = self.definition(i, end, indent, fields, parent)
+                    i = self.skip_blank(i, end)
+            else:  # paragraph
+                fields = {}
+                while i < end and not self.blank(i):
+                    i += 1
+            elements.append((first, fields))
+            i = self.skip_blank(i, end)
+        return elements
+
+    def field(self, i: int, end: int, indent: int, fields: Dict) -> int:
+        match = _field_marker.match(self.lines[i], indent)
+        name = match.group()[1:]
+        name = name[:name.rfind(':')]
+        body_end = self.block_end(i + 1, end, indent)
+        continuation = self.lines[i + 1:body_end]
+        dedent = min(
+            (len(line) - len(line.lstrip()) for line in continuation if line),
+            default=0,
+        )
+        value = [self.lines[i][match.end():]]
+        value.extend(line[dedent:] for line in continuation)
+        fields[name.strip()] = '\n'.join(value).strip()
+        return body_end
+
+    def definition(self, i: int, end: int, indent: int, fields: Dict,
+                   parent: str = '') -> int:
+        key = self.lines[i].strip()
+        body_end = self.block_end(i + 1, end, indent)
+        value = {}
+        for first, res in self.elements(i + 1, body_end, parent + key):
+            for skey in res:
+                if skey in value:
+                    message = 'Overwriting key %s in %s.%s' % (skey, parent, key)
+                    self.warnings.append((first, message))
+                    logger.warning(message, location=self.get_location(first))
+                value[skey] = res[skey]
+        fields[key] = value
+        return body_end
+
+    def get_location(self, i: int):
+        if self.location is not None:
+            return self.location(i)
+        return None
+
+
+class ParseCache:
+    """ content addressed sqlite store of parsed channel specs
+
+    Entries are keyed by a hash of the directive content, its format, the
+    extension version and the rst parser revision, so the cache directory can
+    safely be shared between builds (e.g. restored in CI). An entry holds the
+    spec together with the parser warnings, which are reported again when the
+    entry is reused. Lookups only read, the entries used by a build are
+    written back at once by :meth:`store`, which also evicts the least
+    recently used entries beyond ``max_entries``.
+    """
+    filename = 'asyncapi-parse-cache.sqlite'
+
+    def __init__(self, directory: str, max_entries: int = 1000):
+        self.path = os.path.join(directory, self.filename)
+        self.max_entries = max_entries
+        self._connection = None
+        self._pid = None
+        os.makedirs(directory, exist_ok=True)
+        with self.connection() as con:
+            con.execute(
+                'CREATE TABLE IF NOT EXISTS specs '
+                '(key TEXT PRIMARY KEY, spec BLOB, last_used REAL)'
+            )
+
+    def connection(self) -> sqlite3.Connection:
+        # parallel readers are forked, they must not share the connection
+        if self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=30)
+            self._pid = os.getpid()
+        return self._connection
+
+    def close(self) -> None:
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = self._pid = None
+
+    @staticmethod
+    def make_key(content: str, asyncapi_format: str) -> str:
+        digest = hashlib.sha256()
+        parts = (__version__, str(RstFieldParser.revision), asyncapi_format, content)
+        for part in parts:
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    @staticmethod
+    def dumps(spec: Dict, warnings: List[Tuple[int, str]]) -> bytes:
+        return pickle.dumps((spec, warnings), protocol=pickle.HIGHEST_PROTOCOL)
+
+    def get(self, key: str) -> Any:
+        """ the (spec, warnings) stored for ``key`` or None """
+        row = self.connection().execute(
+            'SELECT spec FROM specs WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return pickle.loads(row[0])
+
+    def store(self, entries: Dict[str, Any]) -> None:
+        """ writes new entries (from :meth:`dumps`), touches the reused ones
+        (``None``) and evicts """
+        now = time.time()
+        with self.connection() as con:
+            con.executemany(
+                'UPDATE specs SET last_used = ? WHERE key = ?',
+                [(now, key) for key, entry in entries.items() if entry is None]
+            )
+            con.executemany(
+                'INSERT OR REPLACE INTO specs (key, spec, last_used) '
+                'VALUES (?, ?, ?)',
+                [(key, entry, now)
+                 for key, entry in entries.items() if entry is not None]
+            )
+            con.execute(
+                'DELETE FROM specs WHERE key NOT IN '
+                '(SELECT key FROM specs ORDER BY last_used DESC LIMIT ?)',
+                (self.max_entries,)
+            )
+
+    def __len__(self) -> int:
+        return self.connection().execute('SELECT COUNT(*) FROM specs').fetchone()[0]
+
+
 def to_fields(x):
     to_definiton_list = False
     for v in x.values():
@@ -68,7 +304,7 @@ def to_fields(x):
         previous_fieldlist = None
         for key,v in x.items():
             df = nodes.definition_list_item()
-            if isinstance(v,str): # embed field_list inside definition_list
+            if not isinstance(v,dict): # embed field_list inside definition_list
                 if previous_fieldlist is None:
                     fv = previous_fieldlist = nodes.field_list()
                     df.append(fv)
@@ -78,7 +314,7 @@ def to_fields(x):
                 fvf = nodes.field()
                 fv.append(fvf)
                 fvf.append(nodes.field_name(text=key))
-                fvf.append(nodes.field_body(v,nodes.Text(v)))
+                fvf.append(nodes.field_body(str(v),nodes.Text(str(v))))
             else:
                 previous_fieldlist = None
                 df.append(nodes.term(text=key))
@@ -91,12 +327,211 @@ def to_fields(x):
         for key,v in x.items():
             df = nodes.field()
             df.append(nodes.field_name(text=key))
-            dfv = nodes.field_body(v,nodes.Text(v))
+            dfv = nodes.field_body(str(v),nodes.Text(str(v)))
             df.append(dfv)
             node.append(df)
     return node
 
 
+# (min, typical, max) serialized length of string formats, without quotes
+string_format_sizes = {
+    'date-time': (20, 24, 35),
+    'date': (10, 10, 10),
+    'time': (8, 12, 21),
+    'uuid': (36, 36, 36),
+    'email': (6, 24, 254),
+    'uri': (8, 40, 2048),
+    'hostname': (1, 16, 253),
+    'ipv4': (7, 13, 15),
+    'ipv6': (2, 26, 45),
+}
+# (min, typical, max) serialized length of scalar types
+scalar_sizes = {
+    'string': (0, 16, None),
+    'number': (1, 8, 24),
+    'integer': (1, 4, 20),
+    'boolean': (4, 4, 5),
+    'null': (4, 4, 4),
+}
+unknown_size = (1, 8, None)
+
+def to_number(value):
+    """ numbers from rst specs are strings, returns None if not a finite number """
+    if isinstance(value, bool):
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if not math.isfinite(value):
+        return None
+    return int(value) if value.is_integer() else value
+
+def add_sizes(*sizes):
+    """ adds (min, typical, max) tuples, an unbounded max stays unbounded """
+    maximum = 0
+    for size in sizes:
+        maximum = None if maximum is None or size[2] is None else maximum + size[2]
+    return (sum(s[0] for s in sizes), sum(s[1] for s in sizes), maximum)
+
+def repeat_size(size, count):
+    if count is None:
+        return None
+    return size * count + max(count - 1, 0)
+
+def estimate_json_size(schema) -> Tuple:
+    """ estimates the (min, typical, max) compact JSON size of a schema in bytes
+
+    The max is None if the schema does not bound the size, e.g. for strings
+    without ``maxLength`` or arrays without ``maxItems``.
+    """
+    if not isinstance(schema, dict):
+        return unknown_size
+    if 'const' in schema:
+        size = len(json.dumps(schema['const'], default=str))
+        return (size, size, size)
+    if isinstance(schema.get('enum'), list) and schema['enum']:
+        # YAML values like dates are not JSON types, count them as strings
+        sizes = [len(json.dumps(value, default=str)) for value in schema['enum']]
+        return (min(sizes), round(sum(sizes) / len(sizes)), max(sizes))
+    for key in ('oneOf', 'anyOf'):
+        if isinstance(schema.get(key), list) and schema[key]:
+            sizes = [estimate_json_size(sub) for sub in schema[key]]
+            maxima = [size[2] for size in sizes]
+            return (
+                min(size[0] for size in sizes),
+                round(sum(size[1] for size in sizes) / len(sizes)),
+                None if None in maxima else max(maxima),
+            )
+    schema_type = schema.get('type')
+    if schema_type is None:
+        if isinstance(schema.get('properties'), dict):
+            schema_type = 'object'
+        elif 'items' in schema:
+            schema_type = 'array'
+    if schema_type == 'object':
+        return estimate_object_size(schema)
+    elif schema_type == 'array':
+        return estimate_array_size(schema)
+    elif schema_type == 'string':
+        return estimate_string_size(schema)
+    elif schema_type == 'integer':
+        # only integers are bounded in length by their range, a number
+        # between 0 and 1 may still serialize with many digits
+        bounds = [to_number(schema.get(key)) for key in ('minimum', 'maximum')]
+        if None not in bounds:
+            lengths = [len(str(int(bound))) for bound in bounds]
+            return (1, max(lengths), max(lengths))
+    return scalar_sizes.get(schema_type, unknown_size)
+
+def to_count(value):
+    """ non negative integer bound or None """
+    value = to_number(value)
+    return None if value is None else max(int(value), 0)
+
+def estimate_string_size(schema) -> Tuple:
+    size = string_format_sizes.get(schema.get('format'), scalar_sizes['string'])
+    minimum = to_count(schema.get('minLength'))
+    maximum = to_count(schema.get('maxLength'))
+    minimum = size[0] if minimum is None else minimum
+    maximum = size[2] if maximum is None else maximum
+    if maximum is not None:
+        # the format may expect more than maxLength allows
+        minimum = min(minimum, maximum)
+    typical = size[1] if maximum is None else min(size[1], maximum)
+    typical = max(typical, minimum)
+    return add_sizes((2, 2, 2), (minimum, typical, maximum))
+
+def estimate_object_size(schema) -> Tuple:
+    properties = schema.get('properties')
+    if not isinstance(properties, dict):
+        properties = {}
+    # as in JSON Schema properties are optional unless listed in required
+    required = schema.get('required')
+    if not isinstance(required, list):
+        required = []
+    required_sizes = []
+    typical, maximum = 2, 2
+    for index, (name, prop_schema) in enumerate(properties.items()):
+        # "name": plus the separating comma
+        key_size = len(json.dumps(name)) + 1
+        size = add_sizes((key_size, key_size, key_size), estimate_json_size(prop_schema))
+        if name in required:
+            required_sizes.append(size[0])
+        comma = 1 if index else 0
+        typical += size[1] + comma
+        maximum = None if maximum is None or size[2] is None else maximum + size[2] + comma
+    minimum = 2 + sum(required_sizes) + max(len(required_sizes) - 1, 0)
+    return (minimum, typical, maximum)
+
+def estimate_array_size(schema) -> Tuple:
+    item = estimate_json_size(schema.get('items'))
+    min_items = to_count(schema.get('minItems')) or 0
+    max_items = to_count(schema.get('maxItems'))
+    if max_items is not None:
+        min_items = min(min_items, max_items)
+    typical_items = max(min_items, 1)
+    if max_items is not None:
+        typical_items = min(typical_items, max_items)
+    return (
+        2 + repeat_size(item[0], min_items),
+        2 + repeat_size(item[1], typical_items),
+        None if max_items is None or item[2] is None else 2 + repeat_size(item[2], max_items),
+    )
+
+def estimate_message_size(op_spec: Dict):
+    """ (min, typical, max) payload size of an operation, None without payload """
+    message = op_spec.get('message') if isinstance(op_spec, dict) else None
+    if not isinstance(message, dict) or 'payload' not in message:
+        return None
+    return estimate_json_size(message['payload'])
+
+def get_message_rate(op_spec: Dict):
+    """ expected messages per second given by ``x-rate`` on the operation or message """
+    if not isinstance(op_spec, dict):
+        return None
+    rate = to_number(op_spec.get('x-rate'))
+    message = op_spec.get('message')
+    if rate is None and isinstance(message, dict):
+        rate = to_number(message.get('x-rate'))
+    return rate
+
+def size_report(channels: Dict) -> List[Dict]:
+    """ per topic and operation payload size and bandwidth estimates """
+    rows = []
+    for topic,topic_spec in channels.items():
+        for operation,op_spec in topic_spec.items():
+            size = estimate_message_size(op_spec) or (None, None, None)
+            rate = get_message_rate(op_spec)
+            bandwidth = [
+                None if rate is None or value is None else value * rate
+                for value in size
+            ]
+            rows.append({
+                'topic': topic,
+                'operation': operation,
+                'min_size': size[0],
+                'typical_size': size[1],
+                'max_size': size[2],
+                'rate': rate,
+                'typical_bandwidth': bandwidth[1],
+                'max_bandwidth': bandwidth[2],
+            })
+    # the channels come in domain merge order, which varies with -j
+    rows.sort(key=lambda row: (row['topic'], row['operation']))
+    return rows
+
+def format_size(op_spec: Dict) -> str:
+    size = estimate_message_size(op_spec)
+    if size is None:
+        return ''
+    text = '%s / %s / %s B' % tuple('∞' if value is None else value for value in size)
+    rate = get_message_rate(op_spec)
+    if rate is not None:
+        text += ' at %s/s (~%s B/s)' % (rate, round(size[1] * rate))
+    return text
+
+
 class asyncapi_node(nodes.Admonition, nodes.Element):
     pass
 
@@ -131,6 +566,7 @@ class AsyncApiChannelDirective(BaseAdmonition,SphinxDirective):
     def run(self):
         asyncapi_format = self.options.get('format', 'rst')
         filepath = self.options.get('from_file')
+        content = '\n'.join(self.content).strip()
         if filepath is not None:
             if asyncapi_format != 'yaml':
                 logger.warning('Selected from_file and rst which is not supported')
@@ -140,17 +576,24 @@ class AsyncApiChannelDirective(BaseAdmonition,SphinxDirective):
                 filepath = os.path.join(cur_dir,filepath)
                 with open(filepath,'r') as infile:
                     content = infile.read()
-        else:
-            content = '\n'.join(self.content).strip()
-        # use all the text
-        as_admonition = asyncapi_format == 'rst'
-        if as_admonition:
-            (channel,) = super().run()  
-            res = get_fields(channel.children[0])
-        elif yaml is not None:
-            res = yaml.load(content)
-        else:
-            raise Exception('Needs optional dependencies ruamel.yaml')
+        domain = self.env.get_domain('asyncapi')
+        cache = domain.parse_cache
+        res = None
+        if cache is not None:
+            cache_key = cache.make_key(content, asyncapi_format)
+            entry = cache.get(cache_key)
+            if entry is not None:
+                res, warnings = entry
+                # the parser did not run, report its warnings again
+                for i, message in warnings:
+                    logger.warning(message, location=self.get_content_location(i))
+                domain.note_parsed_spec(self.env.docname, cache_key, None)
+        if res is None:
+            res, warnings = self.parse(content, asyncapi_format)
+            if cache is not None:
+                # snapshot now, event handlers may modify the spec in place
+                domain.note_parsed_spec(
+                    self.env.docname, cache_key, cache.dumps(res, warnings))
         channels = []
         for topic,topic_spec in res.items():
             for op,op_spec in topic_spec.items():
@@ -164,21 +607,64 @@ class AsyncApiChannelDirective(BaseAdmonition,SphinxDirective):
                 channels.append(channel)
         return channels
 
+    def parse(self, content: str, asyncapi_format: str) -> Tuple[Dict, List]:
+        """ the parsed spec and the parser warnings as (line index, message) """
+        if asyncapi_format == 'rst':
+            parser = RstFieldParser(self.content, self.get_content_location)
+            return parser.parse(), parser.warnings
+        elif yaml is not None:
+            return yaml.load(content), []
+        else:
+            raise Exception('Needs optional dependencies ruamel.yaml')
+
+    def get_content_location(self, i: int) -> str:
+        source, offset = self.content.info(i)
+        return '%s:%s' % (source, offset + 1)
+
+
+def merge_specs(specs: Dict, topics: Dict) -> Dict:
+    """ merges the operations of ``topics`` into the compact ``specs`` """
+    for topic,topic_spec in topics.items():
+        specs.setdefault(topic, {}).update(topic_spec)
+    return specs
 
 class AsynApiDomain(Domain):
     name = 'asyncapi'
     label = 'asyncapi'
+    data_version = 1
+    # opened per build by open_parse_cache if asyncapi_cache_dir is set
+    parse_cache = None  # type: ParseCache
 
     @property
     def channels(self) -> Dict[str, List[asyncapi_node]]:
         return self.data.setdefault('channels', {})
 
+    @property
+    def parsed_specs(self) -> Dict[str, Dict[str, Any]]:
+        """ parse cache keys used per document, with the entry if it was new """
+        return self.data.setdefault('parsed_specs', {})
+
+    def note_parsed_spec(self, docname: str, key: str, entry: Any) -> None:
+        self.parsed_specs.setdefault(docname, {})[key] = entry
+
+    @property
+    def specs(self) -> Dict[str, Dict]:
+        """ compact, transformed channel specs per document """
+        return self.data.setdefault('specs', {})
+
     def clear_doc(self, docname: str) -> None:
         self.channels.pop(docname, None)
+        self.specs.pop(docname, None)
+        self.parsed_specs.pop(docname, None)
 
     def merge_domaindata(self, docnames: List[str], otherdata: Dict) -> None:
         for docname in docnames:
-            self.channels[docname] = otherdata['asyncapi'][docname]
+            if docname in otherdata.get('channels', {}):
+                self.channels[docname] = otherdata['channels'][docname]
+            if docname in otherdata.get('specs', {}):
+                self.specs[docname] = otherdata['specs'][docname]
+            if docname in otherdata.get('parsed_specs', {}):
+                self.parsed_specs[docname] = otherdata['parsed_specs'][docname]
 
     def process_doc(self, env: BuildEnvironment, docname: str,
                     document: nodes.document) -> None:
@@ -186,6 +672,37 @@ class AsynApiDomain(Domain):
         for channel in document.traverse(asyncapi_node):
             env.app.emit('asyncapi-channels-defined', channel)
             channels.append(channel)
+        if not channels:
+            return
+        env.app.emit('asyncapi-doc-channels-defined', docname, channels)
+        specs = {}
+        for channel in channels:
+            merge_specs(specs, copy.deepcopy(channel['asyncapi']))
+        # handlers of this event run in the reader processes under -j
+        env.app.emit('asyncapi-transform-doc-channels', docname, specs)
+        self.specs[docname] = specs
+
+def open_parse_cache(app: Sphinx) -> None:
+    cache_dir = app.config.asyncapi_cache_dir
+    if cache_dir:
+        cache_dir = os.path.join(app.confdir, cache_dir)
+        app.env.get_domain('asyncapi').parse_cache = ParseCache(
+            cache_dir, app.config.asyncapi_cache_size)
+
+def store_parse_cache(app: Sphinx, env: BuildEnvironment) -> None:
+    """ writes the specs used by this build once reading has finished """
+    domain = env.get_domain('asyncapi')
+    if domain.parse_cache is None:
+        return
+    entries = {}
+    for doc_entries in domain.parsed_specs.values():
+        entries.update(doc_entries)
+    domain.parse_cache.store(entries)
+    domain.parse_cache.close()
+    domain.parsed_specs.clear()
+
+def emit_all_channels_defined(app: Sphinx, env: BuildEnvironment) -> None:
+    app.emit('asyncapi-all-channels-defined', env.get_domain('asyncapi').channels)
 
 class AsyncApiDirective(SphinxDirective):
     has_content = True
@@ -195,11 +712,13 @@ class AsyncApiDirective(SphinxDirective):
     option_spec = {
         'class': directives.class_option,
         'name': directives.unchanged,
+        'sizes': directives.flag,
     }
 
     def run(self):
         # Simply insert an empty node which will be replaced later
-        return [asyncapi_overview('',operation=self.arguments[0])]
+        return [asyncapi_overview(
+            '',operation=self.arguments[0],sizes='sizes' in self.options)]
 
 class AsyncApiChannelProcessor:
     def __init__(self, app, doctree, docname):
@@ -210,11 +729,11 @@ class AsyncApiChannelProcessor:
 
         self.process(doctree, docname)
 
-    def create_table(self):
+    def create_table(self, colwidths=(30,70)):
         table = nodes.table()
-        tgroup = nodes.tgroup(cols=2)
+        tgroup = nodes.tgroup(cols=len(colwidths))
         table += tgroup
-        for colwidth in (30,70):
+        for colwidth in colwidths:
             tgroup += nodes.colspec(colwidth=colwidth)
 
         thead = nodes.thead()
@@ -236,8 +755,13 @@ class AsyncApiChannelProcessor:
 
     def create_full_table(self,node,channels,docname):
         wanted_operation = node['operation']
-        table,tbody = self.create_table()
+        with_sizes = node.get('sizes', False)
+        if with_sizes:
+            table,tbody = self.create_table((30,45,25))
+        else:
+            table,tbody = self.create_table()
         per_topic = defaultdict(list)
+        sizes = {}
         for channel in channels:
             for topic,topic_spec in channel['asyncapi'].items():
                 for operation,op_spec in topic_spec.items():
@@ -248,17 +772,21 @@ class AsyncApiChannelProcessor:
                             link_text = channel['ids'][0][2:]
                         ref = self.create_channel_reference(link_text,channel, docname)
                         per_topic[topic].append((op_spec['summary'],ref))
+                        if with_sizes and topic not in sizes:
+                            # estimate from the specs the builder exports
+                            doc_specs = self.domain.specs.get(channel['docname'], {})
+                            spec = doc_specs.get(topic, {}).get(operation, op_spec)
+                            sizes[topic] = format_size(spec)
         for topic,topic_spec in per_topic.items():
             summary = topic_spec[0][0]
             desc_node = nodes.inline(text=summary)
             for _,link in topic_spec:
                 desc_node.append(nodes.inline(text=', '))
                 desc_node.append(link)
-            tbody.append(
-                self.create_table_row(
-                    (topic,desc_node)
-                )
-            )
+            row_cells = (topic,desc_node)
+            if with_sizes:
+                row_cells += (sizes[topic],)
+            tbody.append(self.create_table_row(row_cells))
         return table
 
     def create_table_row(self, row_cells):
@@ -307,17 +835,16 @@ class AsyncApiBuilder(Builder):
         return 'coverage overview'
 
     def write(self, *ignored: Any) -> None:
-        channel_nodes = self.env.domaindata['asyncapi']['channels']
-        import IPython
-        # IPython.embed()
+        specs = self.env.get_domain('asyncapi').specs
         channels = {}
-        for document_name,nodes in channel_nodes.items():
-            for node in nodes:
-                for topic,topic_spec in node['asyncapi'].items():
-                    channels[topic] = topic_spec
+        for document_name,doc_specs in specs.items():
+            merge_specs(channels, copy.deepcopy(doc_specs))
+        self.app.emit('asyncapi-transform-channels', channels)
         self.data['channels'] = channels
        
     def finish(self) -> None:
+        if self.config.asyncapi_size_report:
+            self.write_size_report()
         if yaml is not None:
             path = os.path.join(self.outdir, 'asyncapi.yaml')
             with open(path, 'w') as dumpfile:
@@ -325,15 +852,44 @@ class AsyncApiBuilder(Builder):
         else:
             raise Exception('Needs optional dependencies ruamel.yaml')
 
+    def write_size_report(self) -> None:
+        rows = size_report(self.data['channels'])
+        path = os.path.join(self.outdir, 'asyncapi-sizes.json')
+        with open(path, 'w') as dumpfile:
+            json.dump(rows, dumpfile, indent=2)
+        path = os.path.join(self.outdir, 'asyncapi-sizes.csv')
+        with open(path, 'w', newline='') as dumpfile:
+            writer = csv.DictWriter(dumpfile, fieldnames=[
+                'topic', 'operation', 'min_size', 'typical_size', 'max_size',
+                'rate', 'typical_bandwidth', 'max_bandwidth',
+            ])
+            writer.writeheader()
+            writer.writerows(rows)
+
 def setup(app):
     data = []
     app.setup_extension('sphinx.ext.autodoc')
     app.add_event('asyncapi-channels-defined')
+    app.add_event('asyncapi-doc-channels-defined')
+    app.add_event('asyncapi-all-channels-defined')
+    app.add_event('asyncapi-transform-doc-channels')
+    app.add_event('asyncapi-transform-channels')
     app.add_config_value('asyncapi_data', {}, False)
+    app.add_config_value('asyncapi_cache_dir', None, False)
+    app.add_config_value('asyncapi_cache_size', 1000, False)
+    app.add_config_value('asyncapi_size_report', False, False)
     app.add_node(asyncapi_node,html=(visit_asyncapi_node,depart_asyncapi_node))
     app.add_node(asyncapi_overview)
     app.add_directive('asyncapi_channels', AsyncApiChannelDirective)
     app.add_directive('asyncapi_overview', AsyncApiDirective)
     app.add_domain(AsynApiDomain)
     app.connect('doctree-resolved', AsyncApiChannelProcessor)
+    app.connect('builder-inited', open_parse_cache)
+    app.connect('env-updated', store_parse_cache)
+    app.connect('env-updated', emit_all_channels_defined)
     app.add_builder(AsyncApiBuilder)
+    return {
+        'version': __version__,
+        'parallel_read_safe': True,
+        'parallel_write_safe': True,
+    }
@@ -1,12 +1,16 @@
 import codecs
+import re
 try:
     from setuptools import setup, find_packages
 except ImportError:
     from distutils.core import setup
 
+with codecs.open('asyncapi_sphinx_ext.py', 'r', 'utf-8') as infile:
+    version = re.search(r"^__version__ = '([^']+)'", infile.read(), re.M).group(1)
+
 setup(
     name='asyncapi-sphinx-ext',
-    version='1.0.1',
+    version=version,
     author='Martin Ortbauer',
     author_email='mortbauer@gmail.com',
     url='http://github.com/mortbauer/asyncapi-sphinx-ext',
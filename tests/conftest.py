@@ -1,3 +1,5 @@
+import sys
+
 import pytest
 
 from sphinx.testing.path import path
@@ -7,3 +9,9 @@ pytest_plugins = 'sphinx.testing.fixtures'
 @pytest.fixture(scope='session')
 def rootdir():
     return path(__file__).parent.abspath() / 'roots'
+
+@pytest.fixture(autouse=True)
+def unload_crazy_horse():
+    # every test root documents its own crazy_horse module
+    sys.modules.pop('crazy_horse', None)
+    yield
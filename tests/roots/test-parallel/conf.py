@@ -0,0 +1,9 @@
+import os
+import sys
+
+sys.path.insert(0,os.path.abspath('.'))
+
+extensions = [
+    'sphinx.ext.autodoc',
+    'asyncapi_sphinx_ext',
+]
@@ -14,6 +14,7 @@ def do_nothing(msg):
          publish
            :summary: Current crazy horse status
            :description: This is my cool status
+           :x-rate: 2
           
            message
              :contentType: application/json
@@ -19,6 +19,9 @@ def do_aynthing(msg):
                 at: 
                   type: number
                   format: unix epoch in seconds
+                day:
+                  type: string
+                  enum: [2020-01-01, 2020-01-02]
 
        crazy_pig/<id>/msg:
         subscribe:
@@ -1,7 +1,22 @@
+import datetime
+import os
+import textwrap
+
 import pytest
 
+from docutils.core import publish_doctree
 from sphinx.util import docutils
 
+from asyncapi_sphinx_ext import RstFieldParser, get_fields
+
+
+def rst_root_spec():
+    path = os.path.join(os.path.dirname(__file__), 'roots', 'test-rst',
+                        'crazy_horse.py')
+    with open(path) as infile:
+        docstring = infile.read()
+    return textwrap.dedent(docstring.split(':format: rst')[1].split('"""')[0])
+
 
 @pytest.mark.sphinx('html', testroot='rst', freshenv=True)
 def test_rst(app, status, warning):
@@ -50,3 +65,303 @@ def test_yaml_from_file_asyncapi(app, status, warning):
     app.builder.build_all()
 
     assert len(channels) == 1
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path / 'cache')
+
+@pytest.mark.sphinx('html', testroot='rst', freshenv=True)
+def test_rst_parse_cache(make_app, app_params, cache_dir, monkeypatch):
+    import asyncapi_sphinx_ext
+
+    args, kwargs = app_params
+    kwargs['confoverrides'] = {'asyncapi_cache_dir': cache_dir}
+    app = make_app(*args, **kwargs)
+    app.builder.build_all()
+    specs = [
+        c['asyncapi'] for c in app.env.get_domain('asyncapi').channels['index']
+    ]
+    assert len(asyncapi_sphinx_ext.ParseCache(cache_dir)) == 1
+    assert app.env.get_domain('asyncapi').parsed_specs == {}
+
+    # a fresh environment must be served from the cache without parsing
+    def fail_parse(*args):
+        raise AssertionError('spec was parsed again')
+
+    monkeypatch.setattr(
+        asyncapi_sphinx_ext.AsyncApiChannelDirective, 'parse', fail_parse)
+    fresh = make_app(*args, **kwargs)
+    fresh.builder.build_all()
+    assert [
+        c['asyncapi'] for c in fresh.env.get_domain('asyncapi').channels['index']
+    ] == specs
+
+@pytest.mark.sphinx('html', testroot='rst', freshenv=True)
+def test_rst_parse_cache_snapshot(make_app, app_params, cache_dir):
+    args, kwargs = app_params
+    kwargs['confoverrides'] = {'asyncapi_cache_dir': cache_dir}
+
+    def enrich(app, node):
+        for topic_spec in node['asyncapi'].values():
+            for op_spec in topic_spec.values():
+                op_spec['tags'] = 'enriched'
+
+    app = make_app(*args, **kwargs)
+    app.connect('asyncapi-channels-defined', enrich)
+    app.builder.build_all()
+
+    # the cached spec is the parser output, not the enriched nodes
+    fresh = make_app(*args, **kwargs)
+    fresh.builder.build_all()
+    for channel in fresh.env.get_domain('asyncapi').channels['index']:
+        for topic_spec in channel['asyncapi'].values():
+            for op_spec in topic_spec.values():
+                assert 'tags' not in op_spec
+
+@pytest.mark.sphinx('html', testroot='rst-warning', freshenv=True)
+def test_rst_parse_cache_warnings(make_app, app_params, cache_dir, monkeypatch):
+    import asyncapi_sphinx_ext
+
+    args, kwargs = app_params
+    kwargs['confoverrides'] = {'asyncapi_cache_dir': cache_dir}
+    expected = 'index.rst:11: WARNING: Overwriting key message in crazy_horse/<id>/state.publish'
+
+    cold = make_app(*args, **kwargs)
+    cold.builder.build_all()
+    assert expected in cold._warning.getvalue()
+
+    def fail_parse(*args):
+        raise AssertionError('spec was parsed again')
+
+    monkeypatch.setattr(
+        asyncapi_sphinx_ext.AsyncApiChannelDirective, 'parse', fail_parse)
+    warm = make_app(*args, **kwargs)
+    warm.builder.build_all()
+    assert len(asyncapi_sphinx_ext.ParseCache(cache_dir)) == 1
+    assert expected in warm._warning.getvalue()
+
+def test_parse_cache_lru_eviction(tmp_path):
+    from asyncapi_sphinx_ext import ParseCache
+
+    cache = ParseCache(str(tmp_path), max_entries=2)
+    keys = [cache.make_key(str(i), 'yaml') for i in range(3)]
+    cache.store({
+        keys[0]: cache.dumps({'a': {}}, []),
+        keys[1]: cache.dumps({'b': {}}, []),
+    })
+    assert cache.get(keys[0]) == ({'a': {}}, [])
+    # reused entries are only touched, new ones evict the least recent
+    cache.store({keys[0]: None})
+    cache.store({keys[2]: cache.dumps({'c': {}}, [(1, 'warning')])})
+    assert len(cache) == 2
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == ({'a': {}}, [])
+    assert cache.get(keys[2]) == ({'c': {}}, [(1, 'warning')])
+    assert cache.make_key('x', 'rst') != cache.make_key('x', 'yaml')
+
+@pytest.mark.parametrize('spec', [
+    rst_root_spec(),
+    """
+topic
+  publish
+    :summary: a long
+       summary over lines
+
+       and a second paragraph
+    :escaped\\: name: x
+    :a:b: y
+
+    note paragraph
+    spanning
+
+    message
+      :x: 1
+
+    message
+      :y: 2
+
+      block
+        quote
+""",
+    "paragraph\n\nterm\n  :a: 1\n",
+    "topic\n  .. comment\n  :a: 1\n",
+    "topic\n  ..\n     :b: 2\n  :a: 1\n",
+    "topic\n  publish\n    - a\n    - b\n    :x: 1\n",
+    "topic\n  publish\n    1. a\n       :y: 2\n    :x: 1\n",
+    "topic\n  | line\n  :a: 1\n",
+    "topic\n  -a  option\n  :b: 1\n",
+    "topic\n  --all  option\n     continued\n  :b: 1\n",
+    "topic\n  +---+\n  | x |\n  +---+\n  :b: 1\n",
+    "topic\n  publish\n    +---+---+\n    | a | b |\n    +===+===+\n    | 1 | 2 |\n    +---+---+\n    :x: 1\n",
+    "/users\n  publish\n    :a: 1\n",
+    """
+term
+  :a: 1
+
+  :b: 2
+  nested
+    :c: 3
+  other
+     deeper
+       :d: 4
+     :e: 5
+""",
+])
+def test_rst_parser_parity(spec):
+    document = publish_doctree(spec, settings_overrides={'report_level': 5})
+    expected = get_fields(document.children[0])
+    assert RstFieldParser(spec.splitlines()).parse() == expected
+
+@pytest.mark.sphinx('html', testroot='rst', freshenv=True)
+def test_rst_parser_warning_location(app, status, warning):
+    spec = ['topic', '  :a: 1', '', '  :b: 2', '', '  b', '    :c: 3']
+    location = lambda i: 'spec.rst:%s' % (i + 1)
+    assert RstFieldParser(spec, location).parse() == {
+        'topic': {'a': '1', 'b': {'c': '3'}}}
+    assert 'spec.rst:6' in warning.getvalue()
+    assert 'Overwriting key b in .topic' in warning.getvalue()
+
+@pytest.mark.sphinx('html', testroot='rst', freshenv=True)
+def test_rst_batched_events(app, status, warning):
+    documents = []
+    builds = []
+
+    def on_doc_channels_defined(app, docname, channels):
+        documents.append((docname, len(channels)))
+
+    def on_all_channels_defined(app, channels):
+        builds.append({k: len(v) for k, v in channels.items()})
+
+    app.connect('asyncapi-doc-channels-defined', on_doc_channels_defined)
+    app.connect('asyncapi-all-channels-defined', on_all_channels_defined)
+    app.builder.build_all()
+
+    assert documents == [('index', 2)]
+    assert builds == [{'index': 2}]
+
+@pytest.mark.sphinx('asyncapi', testroot='yaml-from-file', freshenv=True)
+def test_channels_transforms(app, status, warning):
+    calls = []
+
+    def tag_per_document(app, docname, specs):
+        calls.append(('doc', docname))
+        for topic_spec in specs.values():
+            for op_spec in topic_spec.values():
+                op_spec['tags'] = [{'name': 'crazy'}]
+
+    def add_servers(app, specs):
+        calls.append(('build', sorted(specs)))
+        for topic_spec in specs.values():
+            topic_spec['servers'] = ['production']
+
+    app.connect('asyncapi-transform-channels', add_servers)
+    app.connect('asyncapi-transform-doc-channels', tag_per_document)
+    app.builder.build_all()
+
+    assert calls == [('doc', 'index'), ('build', ['crazy_horse/<id>/msg'])]
+    (topic_spec,) = app.builder.data['channels'].values()
+    assert topic_spec['servers'] == ['production']
+    assert topic_spec['publish']['tags'] == [{'name': 'crazy'}]
+    # the transforms leave the documented nodes untouched
+    (channel,) = app.env.get_domain('asyncapi').channels['index']
+    for topic_spec in channel['asyncapi'].values():
+        assert 'tags' not in topic_spec['publish']
+
+@pytest.mark.sphinx('asyncapi', testroot='parallel', freshenv=True, parallel=2)
+def test_parallel(app, status, warning):
+    def note_reader(app, docname, specs):
+        for topic_spec in specs.values():
+            topic_spec['publish']['x-reader'] = os.getpid()
+
+    app.connect('asyncapi-transform-doc-channels', note_reader)
+    app.builder.build_all()
+
+    channels = app.builder.data['channels']
+    assert sorted(channels) == ['topic/%s' % i for i in range(1, 7)]
+    assert channels['topic/3']['publish']['summary'] == 'Topic 3'
+    # the documents were read by forked workers and merged back
+    readers = {spec['publish']['x-reader'] for spec in channels.values()}
+    assert os.getpid() not in readers
+    domain = app.env.get_domain('asyncapi')
+    assert sorted(d for d, c in domain.channels.items() if c) == [
+        'doc%s' % i for i in range(1, 7)]
+
+@pytest.mark.parametrize('schema,expected', [
+    ({'type': 'boolean'}, (4, 4, 5)),
+    ({'type': 'string', 'format': 'uuid'}, (38, 38, 38)),
+    ({'type': 'string', 'minLength': '2', 'maxLength': '4'}, (4, 6, 6)),
+    ({'type': 'string'}, (2, 18, None)),
+    ({'type': 'integer', 'minimum': 0, 'maximum': 100}, (1, 3, 3)),
+    ({'type': 'integer', 'minimum': '-10', 'maximum': '5'}, (1, 3, 3)),
+    ({'type': 'number', 'minimum': '0', 'maximum': '1'}, (1, 8, 24)),
+    ({'type': 'string', 'maxLength': 'inf'}, (2, 18, None)),
+    ({'type': 'string', 'minLength': -5}, (2, 18, None)),
+    ({'type': 'string', 'format': 'uuid', 'maxLength': '10'}, (12, 12, 12)),
+    ({'type': 'array', 'items': {'type': 'boolean'}, 'minItems': -2, 'maxItems': 1},
+     (2, 6, 7)),
+    ({'enum': [datetime.date(2020, 1, 1)]}, (12, 12, 12)),
+    ({'type': 'array', 'items': {'type': 'null'}, 'maxItems': 'nan'}, (2, 6, None)),
+    ({'enum': ['on', 'off']}, (4, 4, 5)),
+    ({'type': 'array', 'items': {'type': 'boolean'}, 'maxItems': 3}, (2, 6, 19)),
+    ({'properties': {'at': {'type': 'number'}, 'ok': {'type': 'boolean'}},
+      'required': ['ok']}, (11, 25, 42)),
+    ({'properties': {'a': {'type': 'boolean'}, 'b': {'type': 'boolean'}},
+      'required': ['b']}, (10, 19, 21)),
+    ({'properties': {'a': {'type': 'boolean'}}}, (2, 10, 11)),
+])
+def test_estimate_json_size(schema, expected):
+    from asyncapi_sphinx_ext import estimate_json_size
+    assert estimate_json_size(schema) == expected
+
+@pytest.mark.sphinx('html', testroot='rst', freshenv=True)
+def test_rst_overview_sizes(app, status, warning):
+    app.builder.build_all()
+    html = (app.outdir / 'index.html').read_text()
+    assert '2 / 38 / 70 B at 2/s (~76 B/s)' in html
+
+@pytest.mark.sphinx('html', testroot='rst', freshenv=True)
+def test_rst_overview_sizes_transformed(app, status, warning):
+    def set_rate(app, docname, specs):
+        for topic_spec in specs.values():
+            for op_spec in topic_spec.values():
+                op_spec['x-rate'] = 4
+
+    app.connect('asyncapi-transform-doc-channels', set_rate)
+    app.builder.build_all()
+    html = (app.outdir / 'index.html').read_text()
+    assert '2 / 38 / 70 B at 4/s (~152 B/s)' in html
+
+@pytest.mark.sphinx('asyncapi', testroot='yaml', freshenv=True,
+                    confoverrides={'asyncapi_size_report': True})
+def test_yaml_size_report_dates(app, status, warning):
+    import json
+
+    app.builder.build_all()
+    with open(os.path.join(app.outdir, 'asyncapi-sizes.json')) as infile:
+        rows = {row['topic']: row for row in json.load(infile)}
+    row = rows['crazy_horse/<id>/msg']
+    assert (row['min_size'], row['typical_size'], row['max_size']) == (2, 34, 50)
+
+@pytest.mark.sphinx('asyncapi', testroot='yaml-from-file', freshenv=True,
+                    confoverrides={'asyncapi_size_report': True})
+def test_yaml_from_file_size_report(app, status, warning):
+    import csv
+    import json
+
+    app.builder.build_all()
+    with open(os.path.join(app.outdir, 'asyncapi-sizes.json')) as infile:
+        (row,) = json.load(infile)
+    assert row['topic'] == 'crazy_horse/<id>/msg'
+    assert row['operation'] == 'publish'
+    assert (row['min_size'], row['typical_size'], row['max_size']) == (2, 15, 31)
+    assert row['rate'] == 0.5
+    assert row['typical_bandwidth'] == 7.5
+    with open(os.path.join(app.outdir, 'asyncapi-sizes.csv')) as infile:
+        (csv_row,) = csv.DictReader(infile)
+    assert csv_row['max_bandwidth'] == '15.5'
+
+def test_size_report_order():
+    from asyncapi_sphinx_ext import size_report
+    rows = size_report({'t/1': {'subscribe': {}, 'publish': {}}, 't/0': {'publish': {}}})
+    assert [(row['topic'], row['operation']) for row in rows] == [
+        ('t/0', 'publish'), ('t/1', 'publish'), ('t/1', 'subscribe')]